@@ -1,18 +1,119 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import RedirectResponse
 from sqlalchemy import create_engine, text
+from typing import Any
 import pandas as pd
+import numpy as np
+import asyncio
 import os
+import time
 
 app = FastAPI()
 
 # Load connection string from Environment Variable
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
+# Build the engine (and its connection pool) once per process so requests only
+# pay for a pool checkout instead of a fresh engine + TCP/TLS handshake.
+ENGINE = create_engine(
+    DATABASE_URL,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+) if DATABASE_URL else None
+
 def get_db_connection():
-    if not DATABASE_URL:
+    if ENGINE is None:
         raise ValueError("Database URL not set")
-    return create_engine(DATABASE_URL)
+    return ENGINE
+
+# Aggregate economic zones reported alongside individual countries
+REGION_CODES = frozenset(['EMU', 'EUU', 'OED', 'CEB', 'EAS', 'LCN', 'MEA', 'NAC', 'SAS', 'SSF', 'WLD'])
+
+# In-process cache of the prepared dataset: (DataFrame, expires_at monotonic time).
+# The table only changes when the ETL runs, so it is re-read at most every CACHE_TTL_SECONDS.
+CACHE_TTL_SECONDS = 600
+_dataset_cache = None
+# Serializes reloads so concurrent requests after expiry share one database read
+_dataset_lock = asyncio.Lock()
+
+# Rows come back in primary-key order so each country's yearly series is already sorted.
+DATASET_QUERY = text(
+    "SELECT country_name, country_iso_code, year, pct_basic, pct_above_basic "
+    "FROM ict_skills_stats ORDER BY country_iso_code, year"
+)
+
+DATASET_DTYPES = {
+    'country_iso_code': 'category',
+    'year': 'int64',
+    'pct_basic': 'float64',
+    'pct_above_basic': 'float64',
+}
+
+def _safe_ratio(numerator, denominator):
+    """
+    Element-wise numerator / denominator over float arrays in one NumPy pass.
+    Entries with a non-positive or missing denominator, or a missing numerator, are 0.
+    """
+    out = np.zeros(len(numerator), dtype='float64')
+    np.divide(numerator, denominator, out=out, where=(denominator > 0) & ~np.isnan(numerator))
+    return out
+
+def _load_and_prepare():
+    engine = get_db_connection()
+
+    # 1. Fetch RAW data, typed on read so no separate conversion passes are needed
+    # (categorical ISO codes let isin/groupby compare integers instead of hashing strings)
+    df = pd.read_sql_query(DATASET_QUERY, engine, dtype=DATASET_DTYPES)
+
+    # 2. Data Cleaning
+    df[['pct_basic', 'pct_above_basic']] = df[['pct_basic', 'pct_above_basic']].fillna(0)
+
+    # Names are only needed for the JSON payload: keep them in a lookup keyed by ISO code
+    # and drop the string column so the per-request filtering moves fewer bytes
+    country_names = df.drop_duplicates('country_iso_code').set_index('country_iso_code')['country_name']
+    df = df.drop(columns='country_name')
+
+    # 3. KPI: Skill Depth Ratio (rows without a basic share get a ratio of 0)
+    df['skill_depth_ratio'] = np.round(
+        _safe_ratio(df['pct_above_basic'].to_numpy(), df['pct_basic'].to_numpy()), 2
+    )
+
+    # 4. Separation: Regions vs Countries (rows stay sorted by country_iso_code, year from the query)
+    is_region = df['country_iso_code'].isin(REGION_CODES)
+    return df[is_region], df[~is_region], country_names
+
+async def load_dataset():
+    """
+    Returns (regions, countries, country_names), reloading them from the database once the cached copy expires.
+    The blocking reload runs in a worker thread so the event loop keeps serving other requests.
+    Only one reload runs at a time; requests that waited on it reuse its result.
+    Callers must treat the returned objects as read-only.
+    """
+    global _dataset_cache
+    if _dataset_cache is None or _dataset_cache[1] <= time.monotonic():
+        async with _dataset_lock:
+            # Re-check: another request may have reloaded while this one waited for the lock
+            if _dataset_cache is None or _dataset_cache[1] <= time.monotonic():
+                dataset = await asyncio.to_thread(_load_and_prepare)
+                _dataset_cache = (dataset, time.monotonic() + CACHE_TTL_SECONDS)
+    return _dataset_cache[0]
+
+def _top_k_indices(values, k):
+    """
+    Positions of the k largest entries of a NumPy array, largest first.
+    A stable sort keeps ties in row order, matching nlargest(keep='first') (and nsmallest
+    when called on negated values); the snapshot is only a few hundred rows.
+    """
+    return np.argsort(-values, kind='stable')[:k]
+
+def _to_records(df, columns):
+    """
+    Same output as df[columns].to_dict('records'), built by zipping whole columns
+    (Series.tolist() yields native Python scalars) instead of walking rows.
+    """
+    return [dict(zip(columns, row)) for row in zip(*(df[col].tolist() for col in columns))]
 
 @app.get("/")
 def read_root():
@@ -23,36 +124,28 @@ def read_api_root():
     return {"message": "API is running. Go to /api/dashboard-data for data."}
 
 @app.get("/api/dashboard-data")
-def get_dashboard_data(
-    start_year: int = Query(2021, description="Start year of analysis"), 
-    end_year: int = Query(2023, description="End year of analysis")
-):
+async def get_dashboard_data(
+    start_year: int = Query(2021, ge=2000, le=2100, description="Start year of analysis"), 
+    end_year: int = Query(2023, ge=2000, le=2100, description="End year of analysis")
+) -> dict[str, Any]:
     """
     Fetches data for a date range.
     - Growth is calculated from start_year to end_year.
     - Snapshot charts (Top 10, Scatter) use end_year data.
     - Trend charts use the full range.
     """
-    try:
-        engine = get_db_connection()
-        
-        # 1. Fetch RAW data
-        query = "SELECT country_name, country_iso_code, year, pct_basic, pct_above_basic FROM ict_skills_stats"
-        df = pd.read_sql(query, engine)
-        
-        # 2. Data Cleaning
-        df['pct_basic'] = pd.to_numeric(df['pct_basic'], errors='coerce').fillna(0)
-        df['pct_above_basic'] = pd.to_numeric(df['pct_above_basic'], errors='coerce').fillna(0)
+    # Reject inverted ranges before touching the cache or the database
+    if start_year > end_year:
+        raise HTTPException(status_code=400, detail="start_year must not be after end_year")
 
-        # 3. KPI: Skill Depth Ratio
-        df['skill_depth_ratio'] = df.apply(
-            lambda x: round(x['pct_above_basic'] / x['pct_basic'], 2) if x['pct_basic'] > 0 else 0, axis=1
-        )
+    try:
+        all_regions, all_countries, country_names = await load_dataset()
 
-        # 4. Filter for Range
-        df_range = df[(df['year'] >= start_year) & (df['year'] <= end_year)].copy()
+        # 5. Filter for Range
+        df_regions = all_regions[all_regions['year'].between(start_year, end_year)]
+        df_countries = all_countries[all_countries['year'].between(start_year, end_year)]
         
-        if df_range.empty:
+        if df_regions.empty and df_countries.empty:
             return {
                 "start_year": start_year,
                 "end_year": end_year,
@@ -66,79 +159,95 @@ def get_dashboard_data(
 
         # Determine effective snapshot year (latest year with data in range)
         # We prefer the end_year, but if no data exists for it, we take the max available year.
-        available_years = df_range['year'].unique()
+        available_years = set(df_regions['year'].unique()) | set(df_countries['year'].unique())
         snapshot_year = end_year if end_year in available_years else max(available_years)
 
-        # 5. Separation: Regions vs Countries
-        region_codes = ['EMU', 'EUU', 'OED', 'CEB', 'EAS', 'LCN', 'MEA', 'NAC', 'SAS', 'SSF', 'WLD']
-        df_regions = df_range[df_range['country_iso_code'].isin(region_codes)]
-        df_countries = df_range[~df_range['country_iso_code'].isin(region_codes)]
-
-        # --- CALCULATE GROWTH (Start to End) ---
-        # Get values at start and end year for each country
-        # Note: We use the actual start/end of the selection for growth, even if snapshot is different.
-        growth_df = df_countries[df_countries['year'].isin([start_year, end_year])].pivot(
-            index='country_iso_code', columns='year', values='pct_above_basic'
-        )
-        
-        # Calculate percentage growth: ((End - Start) / Start) * 100
-        if start_year in growth_df.columns and end_year in growth_df.columns:
-            growth_df['growth'] = ((growth_df[end_year] - growth_df[start_year]) / growth_df[start_year]) * 100
-        else:
-            growth_df['growth'] = 0
-            
-        growth_df['growth'] = growth_df['growth'].fillna(0).replace([float('inf'), -float('inf')], 0)
+        # Pull the year column out once; every per-year selection below reuses it
+        country_years = df_countries['year'].to_numpy()
 
         # --- PREPARE RESPONSE ---
         
         # Snapshot Data (Latest Available Year)
-        latest_year_df = df_countries[df_countries['year'] == snapshot_year].copy()
+        latest_year_df = df_countries.iloc[np.flatnonzero(country_years == snapshot_year)]
         
+        # Snapshot columns as plain arrays for the small top-k selections below
+        iso_codes = latest_year_df['country_iso_code'].to_numpy()
+        names = country_names.loc[iso_codes].to_numpy()
+        basic = latest_year_df['pct_basic'].to_numpy()
+        above_basic = latest_year_df['pct_above_basic'].to_numpy()
+        top_idx = _top_k_indices(above_basic, 10)
+
         # A. Top Countries (Snapshot)
-        top_advanced = latest_year_df.nlargest(10, 'pct_above_basic')[['country_name', 'pct_above_basic']].to_dict('records')
+        top_advanced = [{'country_name': names[i], 'pct_above_basic': float(above_basic[i])} for i in top_idx]
         
         # B. Digital Divide (Growth over Range)
         # Identify top/bottom performers based on LATEST proficiency
-        top_performers = latest_year_df.nlargest(5, 'pct_above_basic')['country_iso_code']
-        bottom_performers = latest_year_df.nsmallest(5, 'pct_above_basic')['country_iso_code']
+        top_performers = iso_codes[top_idx[:5]]
+        bottom_performers = iso_codes[_top_k_indices(-above_basic, 5)]
         
-        divide_data = {
-            "top_tier_avg_growth": growth_df[growth_df.index.isin(top_performers)]['growth'].mean(),
-            "bottom_tier_avg_growth": growth_df[growth_df.index.isin(bottom_performers)]['growth'].mean()
-        }
+        if start_year == end_year:
+            # A single-year selection has no growth to measure
+            divide_data = {"top_tier_avg_growth": 0, "bottom_tier_avg_growth": 0}
+        else:
+            # --- CALCULATE GROWTH (Start to End) ---
+            # Get values at start and end year for each country
+            # Note: We use the actual start/end of the selection for growth, even if snapshot is different.
+            start_vals = df_countries.iloc[np.flatnonzero(country_years == start_year)].set_index('country_iso_code')['pct_above_basic']
+            end_vals = df_countries.iloc[np.flatnonzero(country_years == end_year)].set_index('country_iso_code')['pct_above_basic']
+            # Outer join: a country missing either year still counts, with 0 growth
+            start_vals, end_vals = start_vals.align(end_vals, join='outer')
+
+            # Calculate percentage growth: ((End - Start) / Start) * 100
+            # A zero or missing start (or a missing end) is reported as 0 growth
+            growth = pd.Series(
+                _safe_ratio((end_vals - start_vals).to_numpy(), start_vals.to_numpy()) * 100,
+                index=start_vals.index,
+            )
+
+            divide_data = {
+                "top_tier_avg_growth": float(growth[growth.index.isin(top_performers)].mean()),
+                "bottom_tier_avg_growth": float(growth[growth.index.isin(bottom_performers)].mean())
+            }
 
         # C. Correlation (Snapshot)
         # Filter out 0s to make the chart cleaner
-        correlation_df = latest_year_df[(latest_year_df['pct_basic'] > 0) | (latest_year_df['pct_above_basic'] > 0)]
-        correlation_data = correlation_df[['country_name', 'pct_basic', 'pct_above_basic']].to_dict('records')
+        correlation_data = [
+            {'country_name': names[i], 'pct_basic': float(basic[i]), 'pct_above_basic': float(above_basic[i])}
+            for i in np.flatnonzero((basic > 0) | (above_basic > 0))
+        ]
 
         # D. Skill Depth Leaders (Snapshot)
         # Filter out 0 ratio
-        depth_leaders = latest_year_df[latest_year_df['skill_depth_ratio'] > 0].nlargest(10, 'skill_depth_ratio')[['country_name', 'skill_depth_ratio']].to_dict('records')
+        ratios = latest_year_df['skill_depth_ratio'].to_numpy()
+        positive_idx = np.flatnonzero(ratios > 0)
+        depth_idx = positive_idx[_top_k_indices(ratios[positive_idx], 10)]
+        depth_leaders = [{'country_name': names[i], 'skill_depth_ratio': float(ratios[i])} for i in depth_idx]
 
         # E. Regional Trends (Full Range)
         # Group by region and year to get the trend line
-        regional_trends = df_regions.groupby(['country_name', 'year'])['pct_above_basic'].mean().reset_index()
+        regional_trends = df_regions.groupby(['country_iso_code', 'year'], observed=True)['pct_above_basic'].mean().reset_index()
         # Pivot for easier frontend consumption: { "Euro Area": [ {year: 2021, val: 40}, ... ] }
-        regions_dict = {}
-        for region in regional_trends['country_name'].unique():
-            regions_dict[region] = regional_trends[regional_trends['country_name'] == region][['year', 'pct_above_basic']].to_dict('records')
+        # One groupby pass instead of re-filtering the frame once per region; keyed (and ordered) by name
+        region_points = (
+            (country_names[iso], _to_records(points, ['year', 'pct_above_basic']))
+            for iso, points in regional_trends.groupby('country_iso_code', sort=False, observed=True)
+        )
+        regions_dict = dict(sorted(region_points, key=lambda item: item[0]))
 
         # F. Top Country Trends (Full Range) for Trajectory Chart
         # Use the top performers identified earlier
         top_5_iso = top_performers.tolist()
         df_top_trends = df_countries[df_countries['country_iso_code'].isin(top_5_iso)]
+        trends_by_iso = dict(iter(df_top_trends.groupby('country_iso_code', sort=False, observed=True)))
         
         country_trends = {}
         # We iterate through top_5_iso to maintain order of rank
         for iso in top_5_iso:
-            # Get name safely
-            name_series = df_countries[df_countries['country_iso_code'] == iso]['country_name']
-            if not name_series.empty:
-                c_name = name_series.iloc[0]
-                trend_data = df_top_trends[df_top_trends['country_iso_code'] == iso][['year', 'pct_above_basic']].to_dict('records')
-                country_trends[c_name] = trend_data
+            points = trends_by_iso.get(iso)
+            if points is not None:
+                country_trends[country_names[iso]] = _to_records(points, ['year', 'pct_above_basic'])
 
+        # The declared return type lets FastAPI serialize this straight to JSON bytes via Pydantic
         return {
             "start_year": start_year,
             "end_year": end_year,
@@ -0,0 +1,16 @@
+import functools
+import sqlalchemy
+
+@functools.lru_cache(maxsize=None)
+def get_engine(connection_string):
+    """
+    Returns one pooled engine per connection string, created on first use,
+    so repeated loads in the same process check out pooled connections instead of reconnecting.
+    """
+    return sqlalchemy.create_engine(
+        connection_string,
+        pool_pre_ping=True,
+        pool_size=2,
+        pool_recycle=1800,
+        connect_args={'keepalives': 1, 'keepalives_idle': 30}
+    )
@@ -1,8 +1,12 @@
+import numpy as np
 import pandas as pd
 import sqlalchemy
 from sqlalchemy.dialects.postgresql import insert
+import functools
+import io
 import os
 from dotenv import load_dotenv
+from db import get_engine
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,51 +19,116 @@ DB_CONNECTION_STRING = os.getenv('DATABASE_URL')
 CSV_FILE_PATH = 'data/ITU_DH_SKLS_DIG_CONT.csv'
 TABLE_NAME = 'ict_skills_stats'
 
+# Only these source columns are used by transform_data; everything else is skipped at parse time
+EXTRACT_COLUMNS = ['REF_AREA', 'REF_AREA_LABEL', 'TIME_PERIOD', 'COMP_BREAKDOWN_1', 'OBS_VALUE']
+# Fixed dtypes keep every chunk's schema identical (OBS_VALUE mixes numbers and markers like '_Z';
+# transform_data converts it to numeric)
+EXTRACT_DTYPES = {
+    'REF_AREA': 'str',
+    'REF_AREA_LABEL': 'str',
+    'TIME_PERIOD': 'int32',
+    'COMP_BREAKDOWN_1': 'str',
+    'OBS_VALUE': 'str'
+}
+CHUNK_SIZE = 200_000
+
+# Target table, declared to match create_ict_skills_stats.sql so loading needs no catalog reflection
+metadata = sqlalchemy.MetaData()
+ict_skills_stats = sqlalchemy.Table(
+    TABLE_NAME, metadata,
+    sqlalchemy.Column('country_iso_code', sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column('country_name', sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column('year', sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column('pct_basic', sqlalchemy.Float),
+    sqlalchemy.Column('pct_above_basic', sqlalchemy.Float),
+    sqlalchemy.Column('updated_at', sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now())
+)
+
 def extract_data(file_path):
     """
     Extracts data from the CSV file.
+    Returns an iterator of DataFrame chunks (CHUNK_SIZE rows each) holding only EXTRACT_COLUMNS,
+    so peak memory depends on the chunk size rather than the file size.
     """
     print(f"Extracting data from {file_path}...")
     try:
-        df = pd.read_csv(file_path)
-        print(f"Extracted {len( df)} rows.")
-        return df
+        # The C parser reads the memory-mapped file directly, skipping a copy through Python file buffers
+        reader = pd.read_csv(
+            file_path,
+            usecols=EXTRACT_COLUMNS,
+            dtype=EXTRACT_DTYPES,
+            chunksize=CHUNK_SIZE,
+            engine='c',
+            memory_map=True
+        )
+        print(f"Streaming {len(EXTRACT_COLUMNS)} columns in chunks of {CHUNK_SIZE} rows.")
+        return reader
     except FileNotFoundError:
         print(f"Error: File not found at {file_path}")
         return None
 
+def skill_level_mask(skill_levels):
+    """
+    Boolean mask of the 'BASIC' / 'ABOVE_BASIC' rows.
+    The column is dictionary-encoded once, so the test compares small integer codes
+    against the codes of the wanted levels instead of hashing every string.
+    """
+    categorical = skill_levels.astype('category')
+    categories = categorical.cat.categories
+    wanted_codes = [categories.get_loc(level) for level in ('BASIC', 'ABOVE_BASIC') if level in categories]
+    return np.isin(categorical.cat.codes.to_numpy(), wanted_codes)
+
 def transform_data(df):
     """
-    Transforms the data:
-    1. Filters for 'BASIC' and 'ABOVE_BASIC' skills.
-    2. Pivots the table to have separate columns for each skill level.
+    Transforms the data (a DataFrame, or an iterator of chunks as returned by extract_data):
+    1. Filters for 'BASIC' and 'ABOVE_BASIC' skills, chunk by chunk.
+    2. Reshapes the table to have separate columns for each skill level.
     3. Renames columns to match the SQL schema.
     4. Handles missing values.
     """
     print("Transforming data...")
     
     # 1. Filter rows
-    # Keep only rows where COMP_BREAKDOWN_1 is 'BASIC' or 'ABOVE_BASIC'
-    filtered_df = df[df['COMP_BREAKDOWN_1'].isin(['BASIC', 'ABOVE_BASIC'])].copy()
-    
-    # Ensure OBS_VALUE is numeric, converting non-numeric (like '_Z') to NaN
-    filtered_df['OBS_VALUE'] = pd.to_numeric(filtered_df['OBS_VALUE'], errors='coerce')
-    
-    # 2. Pivot the DataFrame
-    # Index: Columns to keep as identifiers (Country, Year)
-    # Columns: The column whose values will become new column headers (Skill Level)
-    # Values: The value to populate in the new cells (Percentage)
-    pivoted_df = filtered_df.pivot_table(
-        index=['REF_AREA', 'REF_AREA_LABEL', 'TIME_PERIOD'], 
-        columns='COMP_BREAKDOWN_1', 
-        values='OBS_VALUE',
-        aggfunc='first' # Should be unique per group, but 'first' is safe
-    ).reset_index()
+    # Each chunk is filtered as it is read; only the remnants are kept and concatenated
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    filtered_chunks = []
+    for chunk in chunks:
+        # Keep only rows where COMP_BREAKDOWN_1 is 'BASIC' or 'ABOVE_BASIC', and only the columns used below
+        mask = skill_level_mask(chunk['COMP_BREAKDOWN_1'])
+        
+        # Ensure OBS_VALUE is numeric, converting non-numeric (like '_Z') to NaN.
+        # Built out-of-place with assign, so the filtered slice never needs a defensive copy.
+        filtered_chunks.append(
+            chunk.loc[mask, ['REF_AREA', 'REF_AREA_LABEL', 'TIME_PERIOD', 'COMP_BREAKDOWN_1']].assign(
+                OBS_VALUE=pd.to_numeric(chunk.loc[mask, 'OBS_VALUE'], errors='coerce')
+            )
+        )
+    filtered_df = pd.concat(filtered_chunks, ignore_index=True)
+    
+    # Grouping keys as category/int32 so the merge below hashes integer codes instead of Python strings
+    filtered_df = filtered_df.astype({
+        'REF_AREA': 'category',
+        'REF_AREA_LABEL': 'category',
+        'COMP_BREAKDOWN_1': 'category',
+        'TIME_PERIOD': 'int32'
+    })
+    
+    # 2. Reshape to one column per skill level
+    # Identifiers: Country and Year; one value column per skill level (Percentage)
+    # Each (country, year, skill level) should appear once; keep the first if the source repeats one.
+    # With only two known skill levels, two masks and an outer merge on the identifiers replace
+    # a general pivot and its reshaping machinery.
+    key_cols = ['REF_AREA', 'REF_AREA_LABEL', 'TIME_PERIOD']
+    filtered_df = filtered_df.drop_duplicates(subset=key_cols + ['COMP_BREAKDOWN_1'], keep='first')
+    skill_level = filtered_df['COMP_BREAKDOWN_1']
+    basic_df = filtered_df.loc[skill_level == 'BASIC', key_cols + ['OBS_VALUE']].rename(columns={'OBS_VALUE': 'BASIC'})
+    above_df = filtered_df.loc[skill_level == 'ABOVE_BASIC', key_cols + ['OBS_VALUE']].rename(columns={'OBS_VALUE': 'ABOVE_BASIC'})
+    pivoted_df = basic_df.merge(above_df, on=key_cols, how='outer')
+    
+    # As before, country-years with no value at all are dropped
+    pivoted_df = pivoted_df.dropna(subset=['BASIC', 'ABOVE_BASIC'], how='all')
     
     # 3. Rename columns
-    # Flatten the MultiIndex columns if created by pivot_table (though reset_index helps)
-    pivoted_df.columns.name = None 
-    
     rename_map = {
         'REF_AREA': 'country_iso_code',
         'REF_AREA_LABEL': 'country_name',
@@ -69,12 +138,6 @@ def transform_data(df):
     }
     pivoted_df = pivoted_df.rename(columns=rename_map)
     
-    # Ensure all expected columns exist (in case one skill level was missing entirely)
-    expected_cols = ['country_iso_code', 'country_name', 'year', 'pct_basic', 'pct_above_basic']
-    for col in expected_cols:
-        if col not in pivoted_df.columns:
-            pivoted_df[col] = None
-            
     # 4. Handle missing values
     # Fill NaNs with None (which becomes NULL in SQL) or 0 if preferred.
     # The requirement said "0 or None". For percentages, None is often safer if data is missing, 
@@ -82,28 +145,31 @@ def transform_data(df):
     # Let's stick to NaN/None for now as it's more accurate for "missing data".
     # If we wanted 0: pivoted_df = pivoted_df.fillna(0)
     
-    # Select and reorder columns
-    final_df = pivoted_df[expected_cols]
+    expected_cols = ['country_iso_code', 'country_name', 'year', 'pct_basic', 'pct_above_basic']
+    
+    # Select and reorder columns in one reindex (any missing column would be added as NaN),
+    # downcasting to the narrowest types that hold the data
+    # (years fit in int16, percentages need no more than float32) to halve the bytes sent on load
+    final_df = pivoted_df.reindex(columns=expected_cols).astype({
+        'year': 'int16',
+        'pct_basic': 'float32',
+        'pct_above_basic': 'float32'
+    })
     
     print(f"Transformed data shape: {final_df.shape}")
     return final_df
 
-def load_data(df, table_name, connection_string):
+@functools.lru_cache(maxsize=None)
+def upsert_statement(table, columns):
     """
-    Loads data into the Supabase database using an upsert (INSERT ... ON CONFLICT).
+    Builds INSERT INTO <table> (columns) SELECT columns FROM stg_<table> ON CONFLICT DO UPDATE.
+    Cached per (table, columns) so repeated loads reuse the same statement object and
+    SQLAlchemy's compiled form of it.
     """
-    print(f"Loading data into {table_name}...")
-    
-    engine = sqlalchemy.create_engine(connection_string)
-    
-    # Convert DataFrame to list of dictionaries for bulk insert
-    records = df.to_dict(orient='records')
+    staging = sqlalchemy.table(f"stg_{table.name}", *[sqlalchemy.column(c) for c in columns])
     
-    metadata = sqlalchemy.MetaData()
-    table = sqlalchemy.Table(table_name, metadata, autoload_with=engine)
-    
-    # Create the upsert statement
-    stmt = insert(table).values(records)
+    # Create the upsert statement: INSERT ... SELECT from staging
+    stmt = insert(table).from_select(list(columns), sqlalchemy.select(*staging.c))
     
     # Define what to do on conflict (update the values)
     # Exclude primary key columns from the update
@@ -112,14 +178,45 @@ def load_data(df, table_name, connection_string):
         if c.name not in ['country_iso_code', 'year']
     }
     
-    on_conflict_stmt = stmt.on_conflict_do_update(
+    return stmt.on_conflict_do_update(
         index_elements=['country_iso_code', 'year'], # Primary Key
         set_=update_dict
     )
+
+def load_data(df, table_name, connection_string):
+    """
+    Loads data into the Supabase database using an upsert (INSERT ... ON CONFLICT).
+    Rows are streamed with COPY into a temporary staging table, then merged in a single statement.
+    """
+    print(f"Loading data into {table_name}...")
     
-    with engine.connect() as conn:
+    engine = get_engine(connection_string)
+    
+    # Use the declared table; any other table is reflected once and kept in the shared metadata
+    table = metadata.tables.get(table_name)
+    if table is None:
+        table = sqlalchemy.Table(table_name, metadata, autoload_with=engine)
+    
+    # Serialize the DataFrame once as CSV (NaN becomes an empty field, which COPY reads as NULL)
+    columns = list(df.columns)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    
+    staging_name = f"stg_{table.name}"
+    on_conflict_stmt = upsert_statement(table, tuple(columns))
+    
+    # One transaction: the staging table only lives until commit
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"CREATE TEMP TABLE {staging_name} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        # COPY goes through the raw psycopg2 cursor on the same connection
+        with conn.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {staging_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
         result = conn.execute(on_conflict_stmt)
-        conn.commit()
         print(f"Upserted {result.rowcount} rows.")
 
 def main():
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+from api.index import _top_k_indices
+
+def test_top_k_ties_match_pandas():
+    print("Comparing _top_k_indices with nlargest/nsmallest on tied values...")
+
+    # Small integer values (and a block of zeros, as fillna(0) produces) force ties at the k-th boundary
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        values = rng.integers(0, 5, size=rng.integers(1, 30)).astype('float64')
+        values[:rng.integers(0, 5)] = 0
+        series = pd.Series(values)
+        for k in (1, 5, 10):
+            assert _top_k_indices(values, k).tolist() == series.nlargest(k, keep='first').index.tolist()
+            assert _top_k_indices(-values, k).tolist() == series.nsmallest(k, keep='first').index.tolist()
+
+if __name__ == "__main__":
+    test_top_k_ties_match_pandas()
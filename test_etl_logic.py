@@ -1,15 +1,75 @@
+import hashlib
+import os
 import pandas as pd
+import pytest
+import etl
 from etl import transform_data, extract_data
 
+CSV_PATH = 'data/ITU_DH_SKLS_DIG_CONT.csv'
+CACHE_DIR = '.cache'
+
+def load_transformed(file_path):
+    """
+    Returns transform_data's output for the CSV, reusing a pickled copy from CACHE_DIR.
+    The cache key hashes both the CSV and etl.py, so editing either recomputes it.
+    With FAST_TEST=1 only the first 5000 rows are transformed (never cached).
+    """
+    if os.environ.get('FAST_TEST') == '1':
+        return transform_data(pd.read_csv(file_path, nrows=5000))
+    
+    digest = hashlib.blake2b(digest_size=16)
+    for path in (file_path, etl.__file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    cache_path = os.path.join(CACHE_DIR, f"transformed_{digest.hexdigest()}.pkl")
+    if os.path.exists(cache_path):
+        print(f"Using cached transform from {cache_path}")
+        return pd.read_pickle(cache_path)
+    
+    df = extract_data(file_path)
+    if df is None:
+        return None
+    transformed_df = transform_data(df)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    transformed_df.to_pickle(cache_path)
+    return transformed_df
+
+def test_transformation_fixture():
+    print("Running transformation test on an in-memory fixture...")
+    
+    # Hand-built source rows: one complete country-year, one with only a Basic value,
+    # and one row with an unrelated skill level that must be filtered out
+    df = pd.DataFrame({
+        'REF_AREA': ['AUT', 'AUT', 'FRA', 'FRA'],
+        'REF_AREA_LABEL': ['Austria', 'Austria', 'France', 'France'],
+        'TIME_PERIOD': [2023, 2023, 2022, 2022],
+        'COMP_BREAKDOWN_1': ['BASIC', 'ABOVE_BASIC', 'BASIC', 'NONE'],
+        'OBS_VALUE': [22.9956, 53.2072, 40.0, 10.0]
+    })
+    
+    transformed_df = transform_data(df)
+    
+    assert list(transformed_df.columns) == ['country_iso_code', 'country_name', 'year', 'pct_basic', 'pct_above_basic']
+    assert len(transformed_df) == 2
+    
+    aut_2023 = transformed_df[(transformed_df['country_iso_code'] == 'AUT') & (transformed_df['year'] == 2023)].iloc[0]
+    assert aut_2023['country_name'] == 'Austria'
+    assert aut_2023['pct_basic'] == pytest.approx(22.9956, rel=1e-6)
+    assert aut_2023['pct_above_basic'] == pytest.approx(53.2072, rel=1e-6)
+    
+    fra_2022 = transformed_df[(transformed_df['country_iso_code'] == 'FRA') & (transformed_df['year'] == 2022)].iloc[0]
+    assert fra_2022['pct_basic'] == pytest.approx(40.0)
+    assert pd.isna(fra_2022['pct_above_basic'])
+
+@pytest.mark.slow
 def test_transformation():
+    # Smoke test against the full source CSV (deselect with: pytest -m "not slow")
     print("Running transformation test...")
     
     # Use the actual file for testing logic
-    df = extract_data('data/ITU_DH_SKLS_DIG_CONT.csv')
+    transformed_df = load_transformed(CSV_PATH)
     
-    if df is not None:
-        transformed_df = transform_data(df)
-        
+    if transformed_df is not None:
         print("\n--- Transformed Data Preview (First 5 rows) ---")
         print(transformed_df.head().to_string())
         
@@ -44,4 +104,5 @@ def test_transformation():
             print("Warning: AUT 2023 data not found in transformed dataframe.")
 
 if __name__ == "__main__":
+    test_transformation_fixture()
     test_transformation()